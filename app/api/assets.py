@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, status
+
+from app.core import settings
+from app.core.assets import chat_asset_manager, close_http_client
+
+# Create a router for asset management debug endpoints
+router = APIRouter(
+    prefix="/assets",
+    tags=["assets"],
+    # The app includes this router, so its shutdown handlers run with the app's
+    on_shutdown=[close_http_client],
+)
+
+
+@router.get("/avatar-cache")
+async def read_avatar_cache_info():
+    """Get avatar cache statistics (only available in debug mode)."""
+    if not settings.debug:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    
+    return chat_asset_manager.avatar_cache_info()
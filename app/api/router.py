@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 
 # Import all API routers
+from app.api.assets import router as assets_router
 from app.api.auth import router as auth_router
 from app.api.example import router as example_router
 
@@ -8,6 +9,7 @@ from app.api.example import router as example_router
 api_router = APIRouter()
 
 # Include all API routers
+api_router.include_router(assets_router)
 api_router.include_router(auth_router)
 api_router.include_router(example_router)
 
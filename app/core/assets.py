@@ -1,25 +1,287 @@
 """Advanced professional visual asset management system for chat applications"""
 
-import hashlib
-import requests
+import asyncio
+import atexit
+import errno
+import httpx
+import io
+import mmap
+import multiprocessing
+import os
+import platform
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+import PIL
 from PIL import Image
 import uuid
+import xxhash
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# libvips is optional; media images fall back to Pillow when it isn't available
+try:
+    import pyvips
+except (ImportError, OSError):
+    pyvips = None
+
+# libjpeg-turbo's SIMD encoder is optional and only used where its x86-64 kernels exist
+_turbo_jpeg = None
+if platform.machine().lower() in ('x86_64', 'amd64'):
+    try:
+        import numpy as np
+        from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+        _turbo_jpeg = TurboJPEG()
+    except (ImportError, OSError, RuntimeError):
+        _turbo_jpeg = None
+
+
+# Pillow-SIMD publishes ".postN" releases; stock Pillow resizes with scalar kernels
+PILLOW_SIMD = '.post' in PIL.__version__
+logger.debug(
+    "Pillow-SIMD %s (Pillow %s)",
+    "enabled" if PILLOW_SIMD else "not detected, image resizing will use scalar kernels",
+    PIL.__version__
+)
+
+
+# The process pool is started lazily from worker threads, and forking a threaded process can
+# deadlock, so start workers from a clean forkserver (spawn where that isn't available)
+_POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Upper bound on cached avatar URLs so long-running servers don't grow without limit
+AVATAR_CACHE_MAXSIZE = 10_000
+
+# Persistent avatar cache; kept next to chat_app.db, outside the publicly served uploads/ tree
+AVATAR_CACHE_DB = Path("avatar_cache.db")
+
+# File suffixes that are written with the JPEG encoder
+_JPEG_SUFFIXES = {'.jpg', '.jpeg'}
+
+# Uploads larger than this bypass the page cache with O_DIRECT (Linux only)
+_DIRECT_IO_THRESHOLD = 1 << 20
+_DIRECT_IO_ALIGNMENT = 4096
+
+# URL templates for avatars and chat backgrounds, built once instead of per call
+_UNSPLASH_AVATAR_TEMPLATE = "https://source.unsplash.com/150x150/?{terms}&sig={{seed}}"
+_FALLBACK_AVATAR_TEMPLATE = "https://ui-avatars.com/api/?name={username}&background=0084ff&color=fff&size=150&font-size=0.6"
+_CHAT_BACKGROUNDS: Mapping[str, str] = MappingProxyType({
+    'default': 'https://source.unsplash.com/1920x1080/?abstract,minimal,blue',
+    'professional': 'https://source.unsplash.com/1920x1080/?office,workspace,clean',
+    'nature': 'https://source.unsplash.com/1920x1080/?nature,landscape,calm',
+    'geometric': 'https://source.unsplash.com/1920x1080/?geometric,pattern,minimal'
+})
+
+# Shared connection pool for outbound avatar fetches, created lazily on first use
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide async HTTP client."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=16),
+            timeout=httpx.Timeout(5.0),
+            follow_redirects=True
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared HTTP client (call on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _write_file(file_path: Path, file_content: bytes):
+    """Write file contents to disk, using O_DIRECT for large files where supported."""
+    if len(file_content) > _DIRECT_IO_THRESHOLD and hasattr(os, 'O_DIRECT'):
+        try:
+            _write_file_direct(file_path, file_content)
+            return
+        except OSError as e:
+            # Some filesystems (tmpfs, overlayfs, ...) reject O_DIRECT
+            if e.errno != errno.EINVAL:
+                raise
+    
+    with open(file_path, 'wb') as f:
+        f.write(file_content)
+
+
+def _write_file_direct(file_path: Path, file_content: bytes):
+    """Write file contents with O_DIRECT from a page-aligned buffer."""
+    length = len(file_content)
+    aligned_length = -(-length // _DIRECT_IO_ALIGNMENT) * _DIRECT_IO_ALIGNMENT
+    
+    fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DIRECT, 0o644)
+    try:
+        # Anonymous mmaps are page aligned, as O_DIRECT requires
+        with mmap.mmap(-1, aligned_length) as buf:
+            buf.write(file_content)
+            # Release every view before the mmap closes, even if a write fails, so the
+            # OSError reaches _write_file instead of being masked by a BufferError
+            with memoryview(buf) as view:
+                written = 0
+                while written < aligned_length:
+                    with view[written:] as chunk:
+                        written += os.write(fd, chunk)
+        
+        # Drop the zero padding needed to keep the final block aligned
+        os.ftruncate(fd, length)
+    finally:
+        os.close(fd)
+
+
+def _copy_fd(src_fd: int, dst_fd: int, length: int):
+    """Copy ``length`` bytes from the start of ``src_fd`` into ``dst_fd`` inside the kernel."""
+    copied = 0
+    try:
+        while copied < length:
+            n = os.copy_file_range(src_fd, dst_fd, length - copied, copied, copied)
+            if n == 0:
+                break
+            copied += n
+    except (AttributeError, OSError) as e:
+        # copy_file_range is Linux 4.5+ and refuses some filesystem combinations
+        if isinstance(e, OSError) and e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+            raise
+        os.lseek(dst_fd, copied, os.SEEK_SET)
+        while copied < length:
+            n = os.sendfile(dst_fd, src_fd, copied, length - copied)
+            if n == 0:
+                break
+            copied += n
+    
+    if copied < length:
+        raise OSError(f"Source ended after {copied} of {length} bytes")
+
+
+def _encode_jpeg_turbo(img: Image.Image) -> bytes:
+    """Encode an RGB image as JPEG with libjpeg-turbo (single-pass Huffman, 4:2:0)."""
+    return _turbo_jpeg.encode(np.asarray(img), quality=85, pixel_format=TJPF_RGB, jpeg_subsample=TJSAMP_420)
+
+
+def _optimize_avatar_bytes(file_content: bytes, image_path: Path):
+    """Decode avatar bytes in memory, optimize them for web display and write once."""
+    try:
+        with Image.open(io.BytesIO(file_content)) as img:
+            # Let libjpeg decode at a reduced DCT scale instead of full resolution
+            if img.format == 'JPEG':
+                img.draft('RGB', (150, 150))
+            
+            # Convert to RGB if necessary
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            
+            # Resize to standard avatar size
+            img.thumbnail((150, 150), Image.Resampling.LANCZOS)
+            
+            # Save optimized version
+            if _turbo_jpeg is not None:
+                with open(image_path, 'wb') as f:
+                    f.write(_encode_jpeg_turbo(img))
+            else:
+                img.save(image_path, 'JPEG', quality=85, optimize=True)
+    except Exception as e:
+        print(f"Error optimizing avatar: {e}")
+        # Keep the original upload rather than losing it
+        with open(image_path, 'wb') as f:
+            f.write(file_content)
+
+
+def _optimize_media_image_vips(file_content: bytes, image_path: Path):
+    """Shrink-on-load and resize media image bytes with libvips in one streamed pipeline."""
+    img = pyvips.Image.thumbnail_buffer(file_content, 800, height=600, size='down')
+    if image_path.suffix.lower() in _JPEG_SUFFIXES:
+        img.write_to_file(str(image_path), Q=85, strip=True)
+    else:
+        img.write_to_file(str(image_path), strip=True)
+
+
+def _optimize_media_image_bytes(file_content: bytes, image_path: Path):
+    """Decode media image bytes in memory, optimize them for chat display and write once."""
+    if pyvips is not None:
+        try:
+            _optimize_media_image_vips(file_content, image_path)
+            return
+        except pyvips.Error as e:
+            print(f"libvips could not optimize media image, falling back to Pillow: {e}")
+    
+    try:
+        with Image.open(io.BytesIO(file_content)) as img:
+            # Let libjpeg decode at a reduced DCT scale instead of full resolution
+            if img.format == 'JPEG':
+                img.draft('RGB', (800, 600))
+            
+            # Convert to RGB if necessary
+            if img.mode not in ['RGB', 'RGBA']:
+                img = img.convert('RGB')
+            
+            # Resize large images while maintaining aspect ratio
+            max_size = (800, 600)
+            if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
+                img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            
+            # Save optimized version
+            if image_path.suffix.lower() in _JPEG_SUFFIXES:
+                if _turbo_jpeg is not None and img.mode == 'RGB':
+                    with open(image_path, 'wb') as f:
+                        f.write(_encode_jpeg_turbo(img))
+                else:
+                    img.save(image_path, 'JPEG', quality=85, optimize=True)
+            else:
+                img.save(image_path, optimize=True)
+                
+    except Exception as e:
+        print(f"Error optimizing media image: {e}")
+        # Keep the original upload rather than losing it
+        with open(image_path, 'wb') as f:
+            f.write(file_content)
 
 
 class ChatAssetManager:
     """Professional asset management for chat applications with avatar and media handling."""
     
+    # File type for each supported upload extension
+    _EXT_TYPE: Dict[str, str] = {
+        **dict.fromkeys(('jpg', 'jpeg', 'png', 'gif', 'webp'), 'image'),
+        **dict.fromkeys(('pdf', 'doc', 'docx', 'txt', 'rtf'), 'document'),
+        **dict.fromkeys(('mp4', 'avi', 'mov', 'wmv'), 'video'),
+        **dict.fromkeys(('mp3', 'wav', 'ogg', 'm4a'), 'audio')
+    }
+    
     def __init__(self):
-        self.avatar_cache: Dict[str, str] = {}
+        self.avatar_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        # Guards the LRU order and the hit/miss counters across threads
+        self._cache_lock = threading.Lock()
+        
+        # Single-flight guards against duplicate fetches of the same avatar on cold start:
+        # sharded locks for synchronous callers, shared tasks for async callers
+        self._locks = [threading.Lock() for _ in range(16)]
+        self._inflight: Dict[str, "asyncio.Future[str]"] = {}
+        
         self.upload_dir = Path("uploads")
         self.avatar_dir = self.upload_dir / "avatars"
         self.media_dir = self.upload_dir / "media"
         
-        # Create directories
-        self.avatar_dir.mkdir(parents=True, exist_ok=True)
-        self.media_dir.mkdir(parents=True, exist_ok=True)
+        # Pools, directories and the persistent cache are created on first use,
+        # so importing this module (e.g. via the API router) stays free of side effects
+        self._init_lock = threading.Lock()
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._kv_conn: Optional[sqlite3.Connection] = None
+        self._kv_lock = threading.Lock()
         
         # Professional avatar categories for different user types
         self.avatar_categories = {
@@ -28,61 +290,234 @@ class ChatAssetManager:
             'tech': 'technology,developer,workspace',
             'creative': 'creative,artist,design'
         }
+        
+        # Per-category Unsplash URLs with only the seed left to fill in
+        self._unsplash_templates = {
+            category: _UNSPLASH_AVATAR_TEMPLATE.format(terms=terms)
+            for category, terms in self.avatar_categories.items()
+        }
+        self._default_unsplash_template = _UNSPLASH_AVATAR_TEMPLATE.format(terms='portrait,professional')
+    
+    @property
+    def _pool(self) -> ProcessPoolExecutor:
+        """Worker processes for CPU-bound resampling, started on first use."""
+        if self._process_pool is None:
+            with self._init_lock:
+                if self._process_pool is None:
+                    self._process_pool = ProcessPoolExecutor(
+                        max_workers=os.cpu_count() or 1,
+                        mp_context=multiprocessing.get_context(_POOL_START_METHOD)
+                    )
+        return self._process_pool
+    
+    @property
+    def _io_pool(self) -> ThreadPoolExecutor:
+        """Threads that keep several disk writes in flight at once, started on first use."""
+        if self._thread_pool is None:
+            with self._init_lock:
+                if self._thread_pool is None:
+                    self._thread_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="asset-io")
+        return self._thread_pool
+    
+    @property
+    def _kv(self) -> sqlite3.Connection:
+        """Persistent avatar cache connection, opened on first use."""
+        self._ensure_storage()
+        return self._kv_conn
+    
+    def _ensure_storage(self):
+        """Create the upload directories and the persistent avatar cache once."""
+        if self._kv_conn is not None:
+            return
+        
+        with self._init_lock:
+            if self._kv_conn is not None:
+                return
+            
+            self.avatar_dir.mkdir(parents=True, exist_ok=True)
+            self.media_dir.mkdir(parents=True, exist_ok=True)
+            
+            # Persistent avatar cache so warm restarts don't re-resolve every avatar;
+            # WAL lets several worker processes share the file
+            kv = sqlite3.connect(
+                str(AVATAR_CACHE_DB),
+                check_same_thread=False,
+                isolation_level=None
+            )
+            kv.execute("PRAGMA journal_mode=WAL")
+            kv.execute("PRAGMA synchronous=NORMAL")
+            kv.execute(
+                "CREATE TABLE IF NOT EXISTS avatar_cache (cache_key TEXT PRIMARY KEY, avatar_url TEXT NOT NULL)"
+            )
+            atexit.register(kv.close)
+            self._kv_conn = kv
     
     def get_professional_avatar(self, username: str, category: str = 'business') -> str:
-        """Get a professional avatar for a user with fallback options."""
+        """Get a professional avatar for a user with fallback options.
+        
+        Synchronous wrapper kept for legacy callers; async code should await
+        ``get_professional_avatar_async`` or ``get_professional_avatars`` instead.
+        """
         cache_key = f"{username}_{category}"
         
-        if cache_key in self.avatar_cache:
-            return self.avatar_cache[cache_key]
+        cached_url = self._cache_get(cache_key)
+        if cached_url is not None:
+            return cached_url
+        
+        async def _run() -> str:
+            # asyncio.run creates a fresh event loop, so use a client bound to it
+            async with httpx.AsyncClient(timeout=5.0, follow_redirects=True) as client:
+                return await self._fetch(client, username, category)
+        
+        # Threads asking for the same avatar wait for the first fetch instead of repeating it
+        with self._locks[hash(cache_key) & (len(self._locks) - 1)]:
+            with self._cache_lock:
+                cached_url = self.avatar_cache.get(cache_key)
+            if cached_url is not None:
+                return cached_url
+            
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return asyncio.run(_run())
+            
+            # Called from a coroutine: asyncio.run can't nest, so drive the fetch from a worker thread
+            return self._io_pool.submit(lambda: asyncio.run(_run())).result()
+    
+    async def get_professional_avatar_async(self, username: str, category: str = 'business') -> str:
+        """Get a professional avatar for a user without blocking the event loop."""
+        avatars = await self.get_professional_avatars([username], category)
+        return avatars[0]
+    
+    async def get_professional_avatars(self, usernames: List[str], category: str = 'business') -> List[str]:
+        """Fetch avatars for several users concurrently, preserving input order."""
+        client = _get_http_client()
+        return list(await asyncio.gather(*(self._fetch_once(client, username, category) for username in usernames)))
+    
+    async def _fetch_once(self, client: httpx.AsyncClient, username: str, category: str) -> str:
+        """Resolve a single avatar, sharing one in-flight fetch between concurrent callers."""
+        cache_key = f"{username}_{category}"
+        
+        cached_url = self._memory_get(cache_key)
+        if cached_url is None:
+            # SQLite lookups block, so keep them off the event loop
+            cached_url = await asyncio.to_thread(self._persisted_get, cache_key)
+        if cached_url is not None:
+            return cached_url
+        
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(client, username, category))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        
+        # Shield the shared fetch so one cancelled caller doesn't cancel it for the others
+        return await asyncio.shield(task)
+    
+    async def _fetch(self, client: httpx.AsyncClient, username: str, category: str) -> str:
+        """Download an avatar from Unsplash, falling back to UI Avatars on failure."""
+        cache_key = f"{username}_{category}"
         
         try:
             # Generate consistent seed for user
-            seed = hashlib.md5(username.encode()).hexdigest()[:8]
+            seed = f"{xxhash.xxh3_64_intdigest(username.encode()) & 0xFFFFFFFF:08x}"
+            avatar_path = self.avatar_dir / f"{username}_{category}_{seed}.jpg"
+            avatar_url = f"/uploads/avatars/{avatar_path.name}"
+            
+            # Reuse an avatar downloaded by a previous process instead of fetching it again
+            if await asyncio.to_thread(avatar_path.exists):
+                self._cache_set(cache_key, avatar_url, persist=False)
+                await asyncio.to_thread(self._persist, cache_key, avatar_url)
+                return avatar_url
             
             # Try Unsplash first
-            category_terms = self.avatar_categories.get(category, 'portrait,professional')
-            response = requests.get(
-                f"https://source.unsplash.com/150x150/?{category_terms}&sig={seed}",
-                timeout=5,
-                allow_redirects=True
+            url_template = self._unsplash_templates.get(category, self._default_unsplash_template)
+            response = await client.get(
+                url_template.format(seed=seed),
+                timeout=5
             )
             
             if response.status_code == 200:
-                avatar_path = self.avatar_dir / f"{username}_{category}_{seed}.jpg"
-                with open(avatar_path, 'wb') as f:
-                    f.write(response.content)
-                
-                # Optimize image
-                self._optimize_avatar(avatar_path)
+                # Image optimization and the disk write are blocking, keep them off the loop
+                await asyncio.to_thread(self._optimize_avatar, response.content, avatar_path)
                 
-                avatar_url = f"/uploads/avatars/{avatar_path.name}"
-                self.avatar_cache[cache_key] = avatar_url
+                self._cache_set(cache_key, avatar_url, persist=False)
+                await asyncio.to_thread(self._persist, cache_key, avatar_url)
                 return avatar_url
                 
         except Exception as e:
             print(f"Error fetching avatar from Unsplash: {e}")
         
-        # Fallback to UI Avatars
-        fallback_url = f"https://ui-avatars.com/api/?name={username}&background=0084ff&color=fff&size=150&font-size=0.6"
-        self.avatar_cache[cache_key] = fallback_url
+        # Fallback to UI Avatars (not persisted, so Unsplash is retried after a restart)
+        fallback_url = _FALLBACK_AVATAR_TEMPLATE.format(username=username)
+        self._cache_set(cache_key, fallback_url, persist=False)
         return fallback_url
     
-    def _optimize_avatar(self, image_path: Path):
-        """Optimize avatar image for web display."""
-        try:
-            with Image.open(image_path) as img:
-                # Convert to RGB if necessary
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Resize to standard avatar size
-                img.thumbnail((150, 150), Image.Resampling.LANCZOS)
-                
-                # Save optimized version
-                img.save(image_path, 'JPEG', quality=85, optimize=True)
-        except Exception as e:
-            print(f"Error optimizing avatar: {e}")
+    def _cache_get(self, cache_key: str) -> Optional[str]:
+        """Look up a cached avatar URL in memory, then in the persistent store (blocking)."""
+        avatar_url = self._memory_get(cache_key)
+        if avatar_url is None:
+            avatar_url = self._persisted_get(cache_key)
+        return avatar_url
+    
+    def _memory_get(self, cache_key: str) -> Optional[str]:
+        """Look up an avatar URL in the in-memory LRU and mark it as most recently used."""
+        with self._cache_lock:
+            avatar_url = self.avatar_cache.get(cache_key)
+            if avatar_url is not None:
+                self._cache_hits += 1
+                self.avatar_cache.move_to_end(cache_key)
+            return avatar_url
+    
+    def _persisted_get(self, cache_key: str) -> Optional[str]:
+        """Look up an avatar URL in the persistent store, e.g. right after a restart (blocking)."""
+        with self._kv_lock:
+            row = self._kv.execute(
+                "SELECT avatar_url FROM avatar_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+        
+        with self._cache_lock:
+            if row is None:
+                self._cache_misses += 1
+                return None
+            self._cache_hits += 1
+        
+        self._cache_set(cache_key, row[0], persist=False)
+        return row[0]
+    
+    def _cache_set(self, cache_key: str, avatar_url: str, persist: bool = True):
+        """Store an avatar URL, evicting the least recently used entry when full."""
+        with self._cache_lock:
+            self.avatar_cache[cache_key] = avatar_url
+            self.avatar_cache.move_to_end(cache_key)
+            if len(self.avatar_cache) > AVATAR_CACHE_MAXSIZE:
+                self.avatar_cache.popitem(last=False)
+        
+        if persist:
+            self._persist(cache_key, avatar_url)
+    
+    def _persist(self, cache_key: str, avatar_url: str):
+        """Write an avatar URL to the persistent store (blocking)."""
+        with self._kv_lock:
+            self._kv.execute(
+                "INSERT OR REPLACE INTO avatar_cache (cache_key, avatar_url) VALUES (?, ?)",
+                (cache_key, avatar_url)
+            )
+    
+    def avatar_cache_info(self) -> Dict[str, int]:
+        """Get avatar cache statistics in the style of functools.lru_cache.cache_info()."""
+        with self._cache_lock:
+            return {
+                'hits': self._cache_hits,
+                'misses': self._cache_misses,
+                'maxsize': AVATAR_CACHE_MAXSIZE,
+                'currsize': len(self.avatar_cache)
+            }
+    
+    def _optimize_avatar(self, file_content: bytes, image_path: Path):
+        """Optimize avatar bytes for web display in the worker pool and write them to disk."""
+        self._ensure_storage()
+        self._pool.submit(_optimize_avatar_bytes, file_content, image_path).result()
     
     def save_uploaded_avatar(self, username: str, file_content: bytes, filename: str) -> str:
         """Save and process uploaded avatar."""
@@ -95,39 +530,70 @@ class ChatAssetManager:
             unique_filename = f"{username}_{uuid.uuid4().hex[:8]}.{file_extension}"
             file_path = self.avatar_dir / unique_filename
             
-            # Save original file
-            with open(file_path, 'wb') as f:
-                f.write(file_content)
-            
-            # Process and optimize
-            self._optimize_avatar(file_path)
+            # Process, optimize and save in a single write
+            self._optimize_avatar(file_content, file_path)
             
             avatar_url = f"/uploads/avatars/{unique_filename}"
-            self.avatar_cache[username] = avatar_url
+            self._cache_set(username, avatar_url)
             return avatar_url
             
         except Exception as e:
             print(f"Error saving uploaded avatar: {e}")
-            return self.get_professional_avatar(username)
+            # No network round trip on the error path, so this works from any context
+            return _FALLBACK_AVATAR_TEMPLATE.format(username=username)
     
     def save_media_file(self, file_content: bytes, filename: str, username: str) -> tuple[str, str]:
         """Save media file (images, documents) and return URL and file type."""
         try:
+            self._ensure_storage()
+            
             # Generate unique filename
             file_extension = filename.split('.')[-1].lower()
             unique_filename = f"{username}_{uuid.uuid4().hex[:8]}.{file_extension}"
             file_path = self.media_dir / unique_filename
             
-            # Save file
-            with open(file_path, 'wb') as f:
-                f.write(file_content)
+            # Determine file type
+            file_type = self._get_file_type(file_extension)
+            
+            # Optimize images in memory so they are only written once
+            if file_type == 'image':
+                self._optimize_media_image(file_content, file_path)
+            else:
+                _write_file(file_path, file_content)
+            
+            media_url = f"/uploads/media/{unique_filename}"
+            return media_url, file_type
+            
+        except Exception as e:
+            print(f"Error saving media file: {e}")
+            return None, None
+    
+    def save_media_file_fd(self, src_fd: int, length: int, filename: str, username: str) -> tuple[str, str]:
+        """Save media file from an open file descriptor and return URL and file type.
+        
+        Intended for uploads already spooled to disk: non-image files are copied
+        in the kernel (``copy_file_range``/``sendfile``) without passing through
+        Python memory. Images still need decoding, so they are read and optimized.
+        """
+        try:
+            self._ensure_storage()
+            
+            # Generate unique filename
+            file_extension = filename.split('.')[-1].lower()
+            unique_filename = f"{username}_{uuid.uuid4().hex[:8]}.{file_extension}"
+            file_path = self.media_dir / unique_filename
             
             # Determine file type
             file_type = self._get_file_type(file_extension)
             
-            # Optimize if it's an image
             if file_type == 'image':
-                self._optimize_media_image(file_path)
+                self._optimize_media_image(os.pread(src_fd, length, 0), file_path)
+            else:
+                dst_fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                try:
+                    _copy_fd(src_fd, dst_fd, length)
+                finally:
+                    os.close(dst_fd)
             
             media_url = f"/uploads/media/{unique_filename}"
             return media_url, file_type
@@ -136,55 +602,26 @@ class ChatAssetManager:
             print(f"Error saving media file: {e}")
             return None, None
     
+    def save_media_files(self, items: List[Tuple[bytes, str, str]]) -> List[Tuple[str, str]]:
+        """Save several media files at once and return their URLs and file types in order.
+        
+        Each item is a ``(file_content, filename, username)`` tuple as accepted by
+        ``save_media_file``; the writes are issued concurrently so the disk can
+        service them in parallel instead of one blocking write at a time.
+        """
+        return list(self._io_pool.map(lambda item: self.save_media_file(*item), items))
+    
     def _get_file_type(self, extension: str) -> str:
         """Determine file type based on extension."""
-        image_extensions = ['jpg', 'jpeg', 'png', 'gif', 'webp']
-        document_extensions = ['pdf', 'doc', 'docx', 'txt', 'rtf']
-        video_extensions = ['mp4', 'avi', 'mov', 'wmv']
-        audio_extensions = ['mp3', 'wav', 'ogg', 'm4a']
-        
-        if extension in image_extensions:
-            return 'image'
-        elif extension in document_extensions:
-            return 'document'
-        elif extension in video_extensions:
-            return 'video'
-        elif extension in audio_extensions:
-            return 'audio'
-        else:
-            return 'file'
-    
-    def _optimize_media_image(self, image_path: Path):
-        """Optimize media images for chat display."""
-        try:
-            with Image.open(image_path) as img:
-                # Convert to RGB if necessary
-                if img.mode not in ['RGB', 'RGBA']:
-                    img = img.convert('RGB')
-                
-                # Resize large images while maintaining aspect ratio
-                max_size = (800, 600)
-                if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                    img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                
-                # Save optimized version
-                if image_path.suffix.lower() in ['.jpg', '.jpeg']:
-                    img.save(image_path, 'JPEG', quality=85, optimize=True)
-                else:
-                    img.save(image_path, optimize=True)
-                    
-        except Exception as e:
-            print(f"Error optimizing media image: {e}")
+        return self._EXT_TYPE.get(extension, 'file')
+    
+    def _optimize_media_image(self, file_content: bytes, image_path: Path):
+        """Optimize media image bytes for chat display in the worker pool and write them to disk."""
+        self._pool.submit(_optimize_media_image_bytes, file_content, image_path).result()
     
-    def get_chat_background_images(self) -> Dict[str, str]:
+    def get_chat_background_images(self) -> Mapping[str, str]:
         """Get professional chat background options."""
-        backgrounds = {
-            'default': 'https://source.unsplash.com/1920x1080/?abstract,minimal,blue',
-            'professional': 'https://source.unsplash.com/1920x1080/?office,workspace,clean',
-            'nature': 'https://source.unsplash.com/1920x1080/?nature,landscape,calm',
-            'geometric': 'https://source.unsplash.com/1920x1080/?geometric,pattern,minimal'
-        }
-        return backgrounds
+        return _CHAT_BACKGROUNDS
     
     def get_emoji_assets(self) -> Dict[str, str]:
         """Get emoji asset URLs for chat enhancement."""
@@ -13,36 +13,82 @@ Production-ready WhatsApp-style Chat Application with:
 """
 
 import asyncio
+import base64
+import hmac
+import html
+import io
 import os
+import re
+import secrets
+import threading
+import time
+import unicodedata
 import uuid
+from collections import OrderedDict
 from datetime import datetime
+from functools import cache, lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 import hashlib
 
+import httpx
+import orjson
+import xxhash
 from nicegui import ui, app, events
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Index, insert, tuple_
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
+from sqlalchemy.orm import sessionmaker, Session, relationship, joinedload
 from passlib.context import CryptContext
 from PIL import Image
-import requests
-from python_slugify import slugify
 
 # Database setup
 DATABASE_URL = "sqlite:///./chat_app.db"
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune each pooled SQLite connection: WAL lets readers run alongside the writer."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@cache
+def get_pwd_context() -> CryptContext:
+    """Build the bcrypt context on first use rather than at import time."""
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=10)
+
+# Successful password checks, keyed by a per-process HMAC so no plaintext is kept in memory
+_VERIFY_PEPPER = secrets.token_bytes(32)
+_VERIFIED_LOGINS_MAXSIZE = 1024
+_verified_logins: "OrderedDict[bytes, None]" = OrderedDict()
+_verified_logins_lock = threading.Lock()
+
+# SQLite allows a single writer, so serialize commits from async handlers
+# instead of letting them contend for the database lock
+DB_WRITE_LOCK = asyncio.Lock()
 
 # Global state management
 connected_users: Dict[str, dict] = {}
+background_tasks: Set[asyncio.Task] = set()  # strong refs so fire-and-forget tasks aren't collected
 active_sessions: Dict[str, str] = {}  # session_id -> username
 user_sockets: Dict[str, set] = {}  # username -> set of socket connections
 
+# Room membership rarely changes, so cache it instead of querying on every broadcast
+ROOM_MEMBERS_CACHE: Dict[int, Set[str]] = {}  # room_id -> member usernames
+ROOM_MEMBERS_VERSIONS: Dict[int, int] = {}  # room_id -> membership change counter
+ROOM_MEMBERS_LOCK = threading.RLock()
+
+# Profile fields the chat UI needs on every action, keyed by username
+USER_CACHE_TTL = 30.0  # seconds
+USER_CACHE: Dict[str, Tuple[float, dict]] = {}  # username -> (fetched_at, user fields)
+
 # Database Models
 class User(Base):
     __tablename__ = "users"
@@ -62,6 +108,9 @@ class User(Base):
 
 class ChatRoom(Base):
     __tablename__ = "chat_rooms"
+    __table_args__ = (
+        Index('ix_chat_rooms_name', 'name'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -76,6 +125,9 @@ class ChatRoom(Base):
 
 class RoomMember(Base):
     __tablename__ = "room_members"
+    __table_args__ = (
+        Index('ix_room_members_user_room', 'user_id', 'room_id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     room_id = Column(Integer, ForeignKey("chat_rooms.id"))
@@ -88,6 +140,9 @@ class RoomMember(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index('ix_messages_room_created', 'room_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
@@ -102,76 +157,161 @@ class Message(Base):
     sender = relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
     room = relationship("ChatRoom", back_populates="messages")
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
 # Professional Avatar Manager
+@lru_cache(maxsize=4096)
+def generate_initials_avatar(username: str) -> str:
+    """Generate a deterministic initials avatar as an SVG data URI."""
+    # Consistent background hue per username
+    seed = xxhash.xxh3_64_hexdigest(username.encode())[:8]
+    hue = int(seed[:2], 16) * 360 // 256
+    
+    parts = [part for part in re.split(r'[\W_]+', username) if part]
+    initials = ''.join(part[0] for part in parts[:2]).upper() or '?'
+    
+    svg = (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="150" height="150" viewBox="0 0 150 150">'
+        f'<rect width="150" height="150" fill="hsl({hue}, 55%, 45%)"/>'
+        '<text x="50%" y="50%" dy=".35em" text-anchor="middle" '
+        'font-family="Helvetica, Arial, sans-serif" font-size="60" fill="#fff">'
+        f'{html.escape(initials)}</text></svg>'
+    )
+    return "data:image/svg+xml;base64," + base64.b64encode(svg.encode()).decode()
+
+UNSPLASH_AVATAR_URL = "https://source.unsplash.com/150x150/?portrait,professional&sig={seed}"
+UNSPLASH_AVATAR_MAX_BYTES = 5 * 1024 * 1024  # remote content is untrusted, never buffer more than this
+
+# Shared connection pool for background avatar fetches, created lazily on first use
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide async HTTP client."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=4),
+            timeout=httpx.Timeout(5.0),
+            follow_redirects=True
+        )
+    return _http_client
+
+async def close_http_client():
+    """Close the shared HTTP client on shutdown."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 class AvatarManager:
     def __init__(self):
         self.avatar_cache = {}
         self.upload_dir = Path("uploads/avatars")
-        self.upload_dir.mkdir(parents=True, exist_ok=True)
     
     def get_default_avatar(self, username: str) -> str:
         """Get a professional default avatar for a user."""
         if username in self.avatar_cache:
             return self.avatar_cache[username]
         
-        try:
-            # Generate consistent avatar based on username
-            seed = hashlib.md5(username.encode()).hexdigest()[:8]
-            
-            # Try to get a professional portrait from Unsplash
-            response = requests.get(
-                f"https://source.unsplash.com/150x150/?portrait,professional&sig={seed}",
-                timeout=5,
-                allow_redirects=True
-            )
-            
-            if response.status_code == 200:
-                avatar_path = self.upload_dir / f"default_{username}.jpg"
-                with open(avatar_path, 'wb') as f:
-                    f.write(response.content)
-                
-                avatar_url = f"/uploads/avatars/default_{username}.jpg"
-                self.avatar_cache[username] = avatar_url
-                return avatar_url
-        except:
-            pass
-        
-        # Fallback to generated avatar
-        fallback_url = f"https://ui-avatars.com/api/?name={username}&background=0084ff&color=fff&size=150"
-        self.avatar_cache[username] = fallback_url
-        return fallback_url
+        # Generated locally, so render paths never wait on the network or disk
+        return generate_initials_avatar(username)
     
     def save_uploaded_avatar(self, username: str, file_content: bytes) -> str:
         """Save uploaded avatar and return URL."""
         try:
-            # Create unique filename
+            # Create unique filename; usernames are raw user input, so only keep a slug of them
             file_extension = "jpg"
-            filename = f"{username}_{uuid.uuid4().hex[:8]}.{file_extension}"
+            name = _SLUG_RE.sub('-', username.lower()).strip('-')[:32] or 'user'
+            filename = f"{name}_{uuid.uuid4().hex[:8]}.{file_extension}"
             file_path = self.upload_dir / filename
+            if file_path.resolve().parent != self.upload_dir.resolve():
+                raise ValueError(f"Refusing to write avatar outside {self.upload_dir}")
             
-            # Process and save image
-            with open(file_path, 'wb') as f:
-                f.write(file_content)
-            
-            # Resize image
-            with Image.open(file_path) as img:
+            # Decode from memory and write the resized image once
+            with Image.open(io.BytesIO(file_content)) as img:
+                # Let libjpeg decode at a reduced DCT scale instead of full resolution
+                img.draft('RGB', (150, 150))
                 img = img.convert('RGB')
                 img.thumbnail((150, 150), Image.Resampling.LANCZOS)
-                img.save(file_path, 'JPEG', quality=85)
+                # Progressive + optimized Huffman tables, as jpegoptim/mozjpeg would produce
+                img.save(file_path, 'JPEG', quality=82, optimize=True, progressive=True)
             
             avatar_url = f"/uploads/avatars/{filename}"
             self.avatar_cache[username] = avatar_url
+            invalidate_cached_user(username)
             return avatar_url
         except Exception as e:
             print(f"Error saving avatar: {e}")
             return self.get_default_avatar(username)
+    
+    async def fetch_and_replace_avatar_async(self, username: str):
+        """Fetch an Unsplash portrait for a user and store it as their avatar.
+        
+        Runs in the background after registration; the generated default avatar
+        stays in place if the fetch fails.
+        """
+        seed = xxhash.xxh3_64_intdigest(username.encode()) % 1000
+        content = bytearray()
+        try:
+            async with get_http_client().stream('GET', UNSPLASH_AVATAR_URL.format(seed=seed)) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    content += chunk
+                    if len(content) > UNSPLASH_AVATAR_MAX_BYTES:
+                        print(f"Avatar for {username} exceeds {UNSPLASH_AVATAR_MAX_BYTES} bytes, keeping default")
+                        return
+        except httpx.HTTPError as e:
+            print(f"Error fetching avatar for {username}: {e}")
+            return
+        
+        # Nobody awaits this task, so report failures here instead of losing them
+        try:
+            avatar_url = await asyncio.to_thread(self.save_uploaded_avatar, username, bytes(content))
+            if avatar_url.startswith("data:"):
+                return  # Saving failed and fell back to the default avatar
+            
+            db = SessionLocal()
+            try:
+                async with DB_WRITE_LOCK:
+                    await asyncio.to_thread(update_user_avatar, db, username, avatar_url)
+            finally:
+                db.close()
+        except Exception as e:
+            print(f"Error storing avatar for {username}: {e}")
 
 avatar_manager = AvatarManager()
 
+def backfill_user_avatars():
+    """Give every user without a stored avatar its generated default one.
+    
+    ``User.avatar_url`` is the avatar cache for render paths, so it must always be set.
+    """
+    db = SessionLocal()
+    try:
+        users = db.query(User).filter((User.avatar_url.is_(None)) | (User.avatar_url == '')).all()
+        for user in users:
+            user.avatar_url = generate_initials_avatar(user.username)
+        if users:
+            db.commit()
+    finally:
+        db.close()
+
+def init_storage():
+    """Create tables, indexes and upload directories once the server starts."""
+    Base.metadata.create_all(bind=engine)
+    
+    # create_all skips tables that already exist, so add indexes introduced later explicitly
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    
+    avatar_manager.upload_dir.mkdir(parents=True, exist_ok=True)
+    backfill_user_avatars()
+
+app.on_startup(init_storage)
+app.on_shutdown(close_http_client)
+
 # Database utilities
+_SLUG_RE = re.compile(r'[^a-z0-9]+')
+
 def get_db():
     db = SessionLocal()
     try:
@@ -179,9 +319,12 @@ def get_db():
     finally:
         db.close()
 
-def create_user(db: Session, username: str, email: str, password: str, full_name: str = None):
-    """Create a new user."""
-    hashed_password = pwd_context.hash(password)
+def hash_password(password: str) -> str:
+    """Hash a password with bcrypt (CPU-bound, so run it off the event loop)."""
+    return get_pwd_context().hash(password)
+
+def create_user(db: Session, username: str, email: str, hashed_password: str, full_name: str = None):
+    """Create a new user from an already hashed password."""
     avatar_url = avatar_manager.get_default_avatar(username)
     
     db_user = User(
@@ -196,13 +339,50 @@ def create_user(db: Session, username: str, email: str, password: str, full_name
     db.refresh(db_user)
     return db_user
 
+def update_user_avatar(db: Session, username: str, avatar_url: str):
+    """Store a new avatar URL for a user."""
+    db.query(User).filter(User.username == username).update({User.avatar_url: avatar_url})
+    db.commit()
+    invalidate_cached_user(username)
+
+def verify_password_cached(username: str, password: str, hashed_password: str) -> bool:
+    """Verify a password, skipping bcrypt for credentials that already verified."""
+    # The stored hash is part of the key, so a password change invalidates old entries
+    key = hmac.new(
+        _VERIFY_PEPPER,
+        "\0".join((username, password, hashed_password)).encode(),
+        hashlib.sha256
+    ).digest()
+    
+    with _verified_logins_lock:
+        if key in _verified_logins:
+            _verified_logins.move_to_end(key)
+            return True
+    
+    # Failures are never cached, so guessing passwords still pays the full bcrypt cost
+    if not get_pwd_context().verify(password, hashed_password):
+        return False
+    
+    with _verified_logins_lock:
+        _verified_logins[key] = None
+        if len(_verified_logins) > _VERIFIED_LOGINS_MAXSIZE:
+            _verified_logins.popitem(last=False)
+    return True
+
 def authenticate_user(db: Session, username: str, password: str):
     """Authenticate user credentials."""
     user = db.query(User).filter(User.username == username).first()
-    if not user or not pwd_context.verify(password, user.hashed_password):
+    if not user or not verify_password_cached(username, password, user.hashed_password):
         return None
     return user
 
+def slugify(value: str) -> str:
+    """Make a URL-safe room slug: lowercase ASCII words joined by hyphens."""
+    ascii_value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode()
+    slug = _SLUG_RE.sub('-', ascii_value.lower()).strip('-')
+    # Names without any ASCII letters or digits still need a unique, stable slug
+    return slug or hashlib.md5(value.encode()).hexdigest()[:8]
+
 def get_or_create_room(db: Session, room_name: str, created_by: int):
     """Get existing room or create new one."""
     room_slug = slugify(room_name)
@@ -217,6 +397,7 @@ def get_or_create_room(db: Session, room_name: str, created_by: int):
         db.add(room)
         db.commit()
         db.refresh(room)
+        invalidate_room_members(room.id)
     
     return room
 
@@ -231,85 +412,200 @@ def join_room(db: Session, user_id: int, room_id: int):
         membership = RoomMember(user_id=user_id, room_id=room_id)
         db.add(membership)
         db.commit()
+        invalidate_room_members(room_id)
 
 def save_message(db: Session, content: str, sender_id: int, room_id: int, message_type: str = "text"):
-    """Save a new message to the database."""
-    message = Message(
+    """Save a new message to the database and return its id and created_at."""
+    # RETURNING hands back the generated columns without a follow-up SELECT
+    stmt = insert(Message).values(
         content=content,
         sender_id=sender_id,
         room_id=room_id,
         message_type=message_type
-    )
-    db.add(message)
+    ).returning(Message.id, Message.created_at)
+    row = db.execute(stmt).one()
+    db.commit()
+    return row
+
+def save_messages_bulk(db: Session, messages: List[dict]):
+    """Save many messages in one multi-row INSERT.
+    
+    Each dict holds ``Message`` column values (content, sender_id, room_id, ...).
+    """
+    if not messages:
+        return
+    db.execute(insert(Message), messages)
+    db.commit()
+
+def set_user_online(db: Session, username: str, is_online: bool):
+    """Update a user's online status and return the new last-seen time."""
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        return None
+    
+    last_seen = datetime.utcnow()
+    user.is_online = is_online
+    user.last_seen = last_seen
     db.commit()
-    db.refresh(message)
-    return message
+    return last_seen
 
-def get_room_messages(db: Session, room_id: int, limit: int = 50):
-    """Get recent messages for a room."""
-    return db.query(Message).filter(Message.room_id == room_id)\
-             .order_by(Message.created_at.desc())\
-             .limit(limit).all()
+def get_room_messages(db: Session, room_id: int, before: Optional[Tuple[datetime, int]] = None, limit: int = 50):
+    """Get recent messages for a room, optionally only those before a ``(created_at, id)`` cursor."""
+    query = db.query(Message).options(joinedload(Message.sender))\
+              .filter(Message.room_id == room_id)
+    if before is not None:
+        # Keyset pagination: the (room_id, created_at) index (which carries the rowid id)
+        # keeps each page O(limit); id breaks ties between messages sharing a timestamp
+        query = query.filter(tuple_(Message.created_at, Message.id) < tuple_(*before))
+    return query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit).all()
 
-def get_user_rooms(db: Session, user_id: int):
-    """Get all rooms a user is a member of."""
-    return db.query(ChatRoom).join(RoomMember)\
-             .filter(RoomMember.user_id == user_id)\
-             .order_by(ChatRoom.name).all()
+def get_user_rooms(db: Session, user_id: int, limit: Optional[int] = None, offset: int = 0):
+    """Get the rooms a user is a member of, ordered by name.
+    
+    All rooms are returned by default (the sidebar lists every room); pass
+    ``limit``/``offset`` to fetch a single page.
+    """
+    query = db.query(ChatRoom).join(RoomMember)\
+              .filter(RoomMember.user_id == user_id)\
+              .order_by(ChatRoom.name)
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
 
 # WebSocket message broadcasting
-async def broadcast_to_room(room_id: int, message_data: dict):
-    """Broadcast message to all users in a room."""
+def get_room_usernames(room_id: int) -> Set[str]:
+    """Get usernames of all members of a room, cached until membership changes."""
+    with ROOM_MEMBERS_LOCK:
+        usernames = ROOM_MEMBERS_CACHE.get(room_id)
+        if usernames is not None:
+            return usernames
+        version = ROOM_MEMBERS_VERSIONS.get(room_id, 0)
+    
     db = SessionLocal()
     try:
-        # Get all users in the room
-        room_members = db.query(RoomMember).filter(RoomMember.room_id == room_id).all()
-        user_ids = [member.user_id for member in room_members]
-        
-        # Get usernames for these user IDs
-        users = db.query(User).filter(User.id.in_(user_ids)).all()
-        usernames = [user.username for user in users]
-        
-        # Broadcast to all connected users in this room
-        for username in usernames:
-            if username in user_sockets:
-                for socket in user_sockets[username].copy():
-                    try:
-                        await socket.send(message_data)
-                    except:
-                        # Remove disconnected socket
-                        user_sockets[username].discard(socket)
+        # Get usernames of all users in the room in a single query
+        rows = db.query(User.username).join(RoomMember, RoomMember.user_id == User.id)\
+                 .filter(RoomMember.room_id == room_id).all()
+        usernames = {row.username for row in rows}
     finally:
         db.close()
+    
+    # Don't cache a result that a concurrent membership change has already outdated
+    with ROOM_MEMBERS_LOCK:
+        if ROOM_MEMBERS_VERSIONS.get(room_id, 0) == version:
+            ROOM_MEMBERS_CACHE[room_id] = usernames
+    return usernames
+
+def get_cached_user(username: str, db: Session) -> Optional[dict]:
+    """Return id, username, avatar_url and full_name for a user, cached for a short TTL."""
+    now = time.monotonic()
+    entry = USER_CACHE.get(username)
+    if entry and now - entry[0] < USER_CACHE_TTL:
+        return entry[1]
+    
+    row = db.query(User.id, User.username, User.avatar_url, User.full_name)\
+            .filter(User.username == username).first()
+    if not row:
+        return None
+    user = row._asdict()
+    USER_CACHE[username] = (now, user)
+    return user
+
+def invalidate_cached_user(username: str):
+    """Drop a user's cached profile fields after they change."""
+    USER_CACHE.pop(username, None)
+
+def invalidate_room_members(room_id: int):
+    """Drop the cached member list of a room after its membership changed."""
+    with ROOM_MEMBERS_LOCK:
+        ROOM_MEMBERS_CACHE.pop(room_id, None)
+        ROOM_MEMBERS_VERSIONS[room_id] = ROOM_MEMBERS_VERSIONS.get(room_id, 0) + 1
+
+async def send_to_sockets(socket_sets: List[set], data: dict):
+    """Send data to every socket concurrently, removing the ones that fail."""
+    # Serialize once for all recipients instead of once per socket
+    payload = orjson.dumps(data).decode()
+    
+    # Snapshot each set so sockets added or removed during the sends don't disturb the results
+    targets = [(sockets, list(sockets)) for sockets in socket_sets]
+    results = iter(await asyncio.gather(
+        *(socket.send_text(payload) for _, members in targets for socket in members),
+        return_exceptions=True
+    ))
+    
+    # Remove disconnected sockets, one bulk update per set
+    for sockets, members in targets:
+        # zip takes from members first, so it consumes exactly len(members) results
+        dead = [socket for socket, result in zip(members, results) if isinstance(result, BaseException)]
+        if dead:
+            sockets.difference_update(dead)
+
+async def broadcast_to_room(room_id: int, message_data: dict):
+    """Broadcast message to all users in a room."""
+    # Broadcast to all connected users in this room
+    socket_sets = [user_sockets[username] for username in get_room_usernames(room_id) if username in user_sockets]
+    await send_to_sockets(socket_sets, message_data)
 
 async def update_user_status(username: str, is_online: bool):
     """Update user online status and broadcast to connected users."""
     db = SessionLocal()
     try:
-        user = db.query(User).filter(User.username == username).first()
-        if user:
-            user.is_online = is_online
-            user.last_seen = datetime.utcnow()
-            db.commit()
-            
+        async with DB_WRITE_LOCK:
+            last_seen = await asyncio.to_thread(set_user_online, db, username, is_online)
+        
+        if last_seen:
             # Broadcast status update
             status_data = {
                 'type': 'user_status',
                 'username': username,
                 'is_online': is_online,
-                'last_seen': user.last_seen.isoformat()
+                'last_seen': last_seen.isoformat()
             }
             
             # Broadcast to all connected users
-            for connected_username, sockets in user_sockets.items():
-                for socket in sockets.copy():
-                    try:
-                        await socket.send(status_data)
-                    except:
-                        sockets.discard(socket)
+            await send_to_sockets(list(user_sockets.values()), status_data)
     finally:
         db.close()
 
+# Chat message markup, mirroring the NiceGUI row/column/card layout
+MESSAGE_AVATAR_HTML = '<img src="{avatar_url}" class="w-8 h-8 {margin} rounded-full" alt="">'
+MESSAGE_HTML = (
+    '<div class="w-full mb-2 flex flex-row items-start">'
+    '{avatar_before}'
+    '<div class="flex-1 flex flex-col">'
+    '{sender_label}'
+    '<div class="p-3 rounded-lg shadow max-w-xs break-words {bubble_classes}">'
+    '<div>{content}</div>'
+    '<div class="text-xs opacity-70 mt-1">{timestamp}</div>'
+    '</div>'
+    '</div>'
+    '{avatar_after}'
+    '</div>'
+)
+
+def render_message_html(sender: str, content: str, timestamp: str, avatar_url: str, is_own_message: bool) -> str:
+    """Render a chat message as escaped HTML."""
+    avatar_url = html.escape(avatar_url or '')
+    if is_own_message:
+        return MESSAGE_HTML.format(
+            avatar_before='',
+            sender_label='',
+            bubble_classes='bg-blue-500 text-white ml-auto',
+            content=html.escape(content),
+            timestamp=html.escape(timestamp),
+            avatar_after=MESSAGE_AVATAR_HTML.format(avatar_url=avatar_url, margin='ml-2')
+        )
+    return MESSAGE_HTML.format(
+        avatar_before=MESSAGE_AVATAR_HTML.format(avatar_url=avatar_url, margin='mr-2'),
+        sender_label=f'<div class="text-xs text-gray-500 mb-1">{html.escape(sender)}</div>',
+        bubble_classes='bg-gray-200 text-gray-800',
+        content=html.escape(content),
+        timestamp=html.escape(timestamp),
+        avatar_after=''
+    )
+
 # Chat Application UI
 class ChatApp:
     def __init__(self):
@@ -320,6 +616,7 @@ class ChatApp:
         self.online_users_container = None
         self.message_input = None
         self.websocket = None
+        self.oldest_message = None  # (created_at, id) cursor of the oldest message shown
         
     async def handle_websocket_message(self, message):
         """Handle incoming WebSocket messages."""
@@ -342,27 +639,15 @@ class ChatApp:
         
         is_own_message = sender == self.current_user
         
+        # One element (and one browser update) per message instead of a widget tree
         with self.message_container:
-            with ui.row().classes('w-full mb-2'):
-                if not is_own_message:
-                    ui.avatar(avatar_url).classes('w-8 h-8 mr-2')
-                
-                with ui.column().classes('flex-1'):
-                    if not is_own_message:
-                        ui.label(sender).classes('text-xs text-gray-500 mb-1')
-                    
-                    message_classes = 'p-3 rounded-lg max-w-xs break-words'
-                    if is_own_message:
-                        message_classes += ' bg-blue-500 text-white ml-auto'
-                    else:
-                        message_classes += ' bg-gray-200 text-gray-800'
-                    
-                    with ui.card().classes(message_classes):
-                        ui.label(content)
-                        ui.label(timestamp).classes('text-xs opacity-70 mt-1')
-                
-                if is_own_message:
-                    ui.avatar(avatar_url).classes('w-8 h-8 ml-2')
+            ui.html(render_message_html(
+                sender=sender,
+                content=content,
+                timestamp=timestamp,
+                avatar_url=avatar_url,
+                is_own_message=is_own_message
+            )).classes('w-full')
         
         # Auto-scroll to bottom
         ui.run_javascript('document.querySelector(".message-container").scrollTop = document.querySelector(".message-container").scrollHeight')
@@ -379,22 +664,23 @@ class ChatApp:
         db = SessionLocal()
         try:
             # Get current user and room
-            user = db.query(User).filter(User.username == self.current_user).first()
+            user = get_cached_user(self.current_user, db)
             room = db.query(ChatRoom).filter(ChatRoom.id == self.current_room).first()
             
             if user and room:
                 # Save message to database
-                message = save_message(db, content, user.id, room.id)
+                async with DB_WRITE_LOCK:
+                    message = await asyncio.to_thread(save_message, db, content, user['id'], room.id)
                 
                 # Prepare message data for broadcasting
                 message_data = {
                     'type': 'new_message',
                     'id': message.id,
                     'content': content,
-                    'sender': user.username,
+                    'sender': user['username'],
                     'room_id': room.id,
                     'timestamp': message.created_at.strftime('%H:%M'),
-                    'avatar_url': user.avatar_url or avatar_manager.get_default_avatar(user.username)
+                    'avatar_url': user['avatar_url']
                 }
                 
                 # Broadcast to room
@@ -416,35 +702,46 @@ class ChatApp:
         try:
             messages = get_room_messages(db, room_id)
             messages.reverse()  # Show oldest first
+            self.oldest_message = (messages[0].created_at, messages[0].id) if messages else None
             
-            for message in messages:
-                sender = message.sender
-                is_own_message = sender.username == self.current_user
-                
-                with self.message_container:
-                    with ui.row().classes('w-full mb-2'):
-                        if not is_own_message:
-                            ui.avatar(sender.avatar_url or avatar_manager.get_default_avatar(sender.username)).classes('w-8 h-8 mr-2')
-                        
-                        with ui.column().classes('flex-1'):
-                            if not is_own_message:
-                                ui.label(sender.username).classes('text-xs text-gray-500 mb-1')
-                            
-                            message_classes = 'p-3 rounded-lg max-w-xs break-words'
-                            if is_own_message:
-                                message_classes += ' bg-blue-500 text-white ml-auto'
-                            else:
-                                message_classes += ' bg-gray-200 text-gray-800'
-                            
-                            with ui.card().classes(message_classes):
-                                ui.label(message.content)
-                                ui.label(message.created_at.strftime('%H:%M')).classes('text-xs opacity-70 mt-1')
-                        
-                        if is_own_message:
-                            ui.avatar(sender.avatar_url or avatar_manager.get_default_avatar(sender.username)).classes('w-8 h-8 ml-2')
+            with self.message_container:
+                self.render_messages(messages)
         finally:
             db.close()
     
+    def load_older_messages(self):
+        """Load the page of messages preceding the oldest one shown."""
+        if not self.message_container or not self.current_room or not self.oldest_message:
+            return
+        
+        db = SessionLocal()
+        try:
+            messages = get_room_messages(db, self.current_room, before=self.oldest_message)
+            if not messages:
+                return
+            messages.reverse()  # Show oldest first
+            self.oldest_message = (messages[0].created_at, messages[0].id)
+            
+            with self.message_container:
+                self.render_messages(messages).move(self.message_container, target_index=0)
+        finally:
+            db.close()
+    
+    def render_messages(self, messages):
+        """Render messages into a single ui.html element."""
+        # One DOM update instead of several NiceGUI elements per message
+        rendered = [
+            render_message_html(
+                sender=message.sender.username,
+                content=message.content,
+                timestamp=message.created_at.strftime('%H:%M'),
+                avatar_url=message.sender.avatar_url,
+                is_own_message=message.sender.username == self.current_user
+            )
+            for message in messages
+        ]
+        return ui.html(f'<div class="w-full">{"".join(rendered)}</div>').classes('w-full')
+    
     def switch_room(self, room_id: int, room_name: str):
         """Switch to a different chat room."""
         self.current_room = room_id
@@ -463,9 +760,9 @@ class ChatApp:
         
         db = SessionLocal()
         try:
-            user = db.query(User).filter(User.username == self.current_user).first()
+            user = get_cached_user(self.current_user, db)
             if user:
-                rooms = get_user_rooms(db, user.id)
+                rooms = get_user_rooms(db, user['id'])
                 
                 with self.room_list_container:
                     for room in rooms:
@@ -482,16 +779,18 @@ class ChatApp:
         
         db = SessionLocal()
         try:
-            user = db.query(User).filter(User.username == self.current_user).first()
+            user = get_cached_user(self.current_user, db)
             if user:
-                room = get_or_create_room(db, room_name.strip(), user.id)
-                join_room(db, user.id, room.id)
+                async with DB_WRITE_LOCK:
+                    room = await asyncio.to_thread(get_or_create_room, db, room_name.strip(), user['id'])
+                    room_id, name = room.id, room.name
+                    await asyncio.to_thread(join_room, db, user['id'], room_id)
                 
                 # Refresh room list
                 self.load_user_rooms()
                 
                 # Switch to new room
-                self.switch_room(room.id, room.name)
+                self.switch_room(room_id, name)
         finally:
             db.close()
 
@@ -523,7 +822,8 @@ async def login_page():
     async def handle_login():
         db = SessionLocal()
         try:
-            user = authenticate_user(db, username_input.value, password_input.value)
+            # bcrypt is CPU-bound, keep it off the event loop
+            user = await asyncio.to_thread(authenticate_user, db, username_input.value, password_input.value)
             if user:
                 # Set session
                 session_id = str(uuid.uuid4())
@@ -590,14 +890,24 @@ async def register_page():
                 error_label.text = 'Username or email already exists'
                 return
             
+            # Hash before taking the write lock so bcrypt doesn't stall other writers
+            hashed_password = await asyncio.to_thread(hash_password, password_input.value)
+            
             # Create new user
-            user = create_user(
-                db, 
-                username_input.value, 
-                email_input.value, 
-                password_input.value,
-                full_name_input.value
-            )
+            async with DB_WRITE_LOCK:
+                user = await asyncio.to_thread(
+                    create_user,
+                    db, 
+                    username_input.value, 
+                    email_input.value, 
+                    hashed_password,
+                    full_name_input.value
+                )
+            
+            # Upgrade the default avatar without holding up the response
+            task = asyncio.create_task(avatar_manager.fetch_and_replace_avatar_async(user.username))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
             
             success_label.text = 'Registration successful! You can now login.'
             error_label.text = ''
@@ -667,12 +977,12 @@ async def chat_page():
                 # User info
                 db = SessionLocal()
                 try:
-                    user = db.query(User).filter(User.username == username).first()
+                    user = get_cached_user(username, db)
                     if user:
                         with ui.row().classes('w-full items-center mb-4 p-2 bg-white rounded'):
-                            ui.avatar(user.avatar_url or avatar_manager.get_default_avatar(username)).classes('w-10 h-10')
+                            ui.avatar(user['avatar_url']).classes('w-10 h-10')
                             with ui.column().classes('ml-2'):
-                                ui.label(user.full_name or username).classes('font-semibold')
+                                ui.label(user['full_name'] or username).classes('font-semibold')
                                 ui.label('Online').classes('text-xs text-green-500')
                 finally:
                     db.close()
@@ -680,6 +990,7 @@ async def chat_page():
                 # Logout button
                 ui.button('Logout', on_click=lambda: [
                     active_sessions.pop(session_id, None),
+                    invalidate_cached_user(username),
                     app.storage.user.clear(),
                     ui.navigate.to('/')
                 ]).classes('w-full bg-red-500 text-white mb-4')
@@ -705,6 +1016,8 @@ async def chat_page():
                 
                 # Messages area
                 with ui.scroll_area().classes('flex-1 p-4 message-container'):
+                    ui.button('Load earlier messages', on_click=chat_app.load_older_messages)\
+                      .props('flat dense').classes('self-center text-xs text-gray-500')
                     chat_app.message_container = ui.column().classes('w-full')
                 
                 # Message input
@@ -713,7 +1026,8 @@ async def chat_page():
                     chat_app.message_input.on('keydown.enter', chat_app.send_message)
                     ui.button('Send', on_click=chat_app.send_message).classes('bg-blue-500 text-white')
 
-# Static file serving for uploads
+# Static file serving for uploads (StaticFiles requires the directory to exist when mounted)
+Path('uploads').mkdir(exist_ok=True)
 app.add_static_files('/uploads', 'uploads')
 
 if __name__ in {"__main__", "__mp_main__"}: